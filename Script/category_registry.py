@@ -0,0 +1,54 @@
+class CategoryRegistry:
+    """Keeps the category list of the file with fast lookups.
+
+    The underlying list stays the one stored in the data dict, so saving
+    the file works as before. Ids are the position of the category in that
+    list, which never changes because categories are only appended. For that
+    the registry removes duplicates from the given list in place, so the next
+    save writes the list without them. The sorted view is a tuple so that
+    widgets cannot change the cache.
+    """
+    def __init__(self, names):
+        self.names = names
+        self.ids = {}
+        for name in names:
+            if name not in self.ids:
+                self.ids[name] = len(self.ids)
+        names[:] = list(self.ids)
+        self.sorted_cache = None
+        self.subscribers = []
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_id(self, name):
+        return self.ids.get(name)
+
+    def get_name(self, category_id):
+        return self.names[category_id]
+
+    def sorted(self):
+        if self.sorted_cache is None:
+            self.sorted_cache = tuple(sorted(self.names))
+        return self.sorted_cache
+
+    def add(self, name):
+        if name in self.ids:
+            return False
+        self.ids[name] = len(self.names)
+        self.names.append(name)
+        self.sorted_cache = None
+        self.notify()
+        return True
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        callback(self.sorted())
+
+    def notify(self):
+        values = self.sorted()
+        for callback in self.subscribers:
+            callback(values)
@@ -0,0 +1,469 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+FILE_NAME = 'database.json'
+DEFAULT_CATEGORIES = ["shopping", "taxes", "groceries"]
+DEFAULT_FILE_PARTS = ["Operations", "Categories", "balance"]
+
+# one socket per user, so the ledger of one user is not served to another
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), f"expense_tracker-{os.getuid()}.sock"
+                                   if hasattr(os, "getuid") else "expense_tracker.sock")
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_POOL_SIZE = 4
+# seconds a client waits for the service before giving up
+CLIENT_TIMEOUT = 5.0
+
+# how many changes the service remembers for clients catching up, older clients reload everything
+MAX_CHANGES = 10000
+# seconds the service waits after a change before writing the file, so a burst of changes is written once
+SAVE_DELAY = 1.0
+
+
+class LedgerServiceError(Exception):
+    pass
+
+
+def restore_data(data):
+    """Adds the missing parts of the file with their default values"""
+    for key in DEFAULT_FILE_PARTS:
+        if key not in data:
+            data[key] = {}
+            if key == "Categories":
+                data[key] = list(DEFAULT_CATEGORIES)
+            if key == "balance":
+                data[key] = 0
+    return data
+
+
+###########################################################
+# Ledger kept in memory by the service
+###########################################################
+class Ledger:
+    """The same data as database.json, plus per category totals for aggregates.
+
+    Dates are timestamps "YYYYMMDD" like the ones built by the app. Every
+    operation gets an id when it is loaded or added; ids only live in memory
+    and are what clients use to edit and delete. Every change gets a version
+    number so clients can ask for the changes they missed. Ids and versions
+    start again on every load, so they come with the instance token of the
+    load: a client holding another token must reload, and its edits and
+    deletes are rejected.
+    """
+    def __init__(self, file_name=FILE_NAME, max_changes=MAX_CHANGES):
+        self.file_name = file_name
+        self.max_changes = max_changes
+        # the service writes from an executor thread, writes must not share the temporary file
+        self.write_lock = threading.Lock()
+        self.data = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.file_name, 'r') as f:
+                self.data = json.load(f)
+        except FileNotFoundError:
+            pass
+        restore_data(self.data)
+        self.categories = set(self.data["Categories"])
+        self.category_totals = {}
+        self.operations = {}
+        self.ids = {}
+        self.next_id = 0
+        self.version = 0
+        self.instance = uuid.uuid4().hex
+        self.changes = deque(maxlen=self.max_changes)
+        for date, operation in self.iter_operations():
+            self._register(date, operation)
+            self._count(operation, 1)
+
+    def dumps(self):
+        return json.dumps(self.data, indent=4)
+
+    def write(self, text):
+        # written next to the file and then swapped, so a crash never leaves half a file
+        temp_name = f"{self.file_name}.tmp"
+        with self.write_lock:
+            with open(temp_name, 'w') as f:
+                f.write(text)
+            os.replace(temp_name, self.file_name)
+
+    def save(self):
+        self.write(self.dumps())
+
+    def iter_operations(self, year=None, month=None, day=None):
+        for y, months in self.data["Operations"].items():
+            if year is not None and y != year:
+                continue
+            for m, days in months.items():
+                if month is not None and m != month:
+                    continue
+                for d, ops in days.items():
+                    if day is not None and d != day:
+                        continue
+                    for operation in ops:
+                        yield f"{y}{m}{d}", operation
+
+    def _register(self, date, operation):
+        operation_id = self.next_id
+        self.next_id += 1
+        self.operations[operation_id] = (date, operation)
+        self.ids[id(operation)] = operation_id
+        return operation_id
+
+    def _count(self, operation, sign):
+        category = operation["category"]
+        self.category_totals[category] = self.category_totals.get(category, 0) + sign * operation["value"]
+
+    def _record(self, change):
+        self.version += 1
+        change["version"] = self.version
+        self.changes.append(change)
+        return change
+
+    def describe(self, operation_id):
+        date, operation = self.operations[operation_id]
+        return {"id": operation_id, "date": date, **operation}
+
+###### Checks, done before anything is changed ######
+    @staticmethod
+    def check_date(date):
+        if not isinstance(date, str) or len(date) != 8 or not date.isdigit():
+            raise LedgerServiceError(f"Date must be YYYYMMDD: {date!r}")
+        try:
+            datetime.strptime(date, "%Y%m%d")
+        except ValueError:
+            raise LedgerServiceError(f"Date does not exist: {date}")
+
+    @staticmethod
+    def check_value(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise LedgerServiceError(f"Value must be a number: {value!r}")
+
+    @staticmethod
+    def check_category(category):
+        if not isinstance(category, str) or category.strip() == "":
+            raise LedgerServiceError(f"Category must be a non empty string: {category!r}")
+
+    @staticmethod
+    def check_note(note):
+        if note is not None and not isinstance(note, str):
+            raise LedgerServiceError(f"Note must be a string: {note!r}")
+
+    def check_instance(self, instance):
+        if instance != self.instance:
+            raise LedgerServiceError("The ledger service was restarted, reload the ledger")
+
+    def check_id(self, operation_id):
+        if isinstance(operation_id, bool) or not isinstance(operation_id, int) or operation_id not in self.operations:
+            raise LedgerServiceError(f"No operation with id {operation_id!r}")
+
+###### Requests ######
+    def add(self, date, value, category, note=None):
+        self.check_date(date)
+        self.check_value(value)
+        self.check_category(category)
+        self.check_note(note)
+
+        operation = {"value": value, "category": category}
+        if note:
+            operation["note"] = note
+        months = self.data["Operations"].setdefault(date[0:4], {})
+        days = months.setdefault(date[4:6], {})
+        days.setdefault(date[6:8], []).append(operation)
+        # keep the file sorted like App.sort_file does
+        if list(days) != sorted(days):
+            months[date[4:6]] = dict(sorted(days.items()))
+        if list(months) != sorted(months):
+            self.data["Operations"][date[0:4]] = dict(sorted(months.items()))
+        if list(self.data["Operations"]) != sorted(self.data["Operations"]):
+            self.data["Operations"] = dict(sorted(self.data["Operations"].items()))
+        self.data["balance"] += value
+        self._count(operation, 1)
+        operation_id = self._register(date, operation)
+        return self._record({"kind": "add", "operation": self.describe(operation_id)})
+
+    def edit(self, operation_id, value, category, *, instance):
+        self.check_instance(instance)
+        self.check_id(operation_id)
+        self.check_value(value)
+        self.check_category(category)
+
+        _, operation = self.operations[operation_id]
+        self._count(operation, -1)
+        self.data["balance"] += value - operation["value"]
+        operation["value"] = value
+        operation["category"] = category
+        self._count(operation, 1)
+        return self._record({"kind": "edit", "operation": self.describe(operation_id)})
+
+    def delete(self, operation_id, *, instance):
+        self.check_instance(instance)
+        self.check_id(operation_id)
+
+        change = {"kind": "delete", "operation": self.describe(operation_id)}
+        date, operation = self.operations.pop(operation_id)
+        del self.ids[id(operation)]
+        year, month, day = date[0:4], date[4:6], date[6:8]
+        ops = self.data["Operations"][year][month][day]
+        # by identity, two operations may be equal
+        ops.pop(next(index for index, op in enumerate(ops) if op is operation))
+        if not ops:
+            del self.data["Operations"][year][month][day]
+            if not self.data["Operations"][year][month]:
+                del self.data["Operations"][year][month]
+                if not self.data["Operations"][year]:
+                    del self.data["Operations"][year]
+        self.data["balance"] -= operation["value"]
+        self._count(operation, -1)
+        return self._record(change)
+
+    def add_category(self, name):
+        self.check_category(name)
+        if name in self.categories:
+            return None
+        self.categories.add(name)
+        self.data["Categories"].append(name)
+        return self._record({"kind": "category", "name": name})
+
+    def load_all(self):
+        """The whole ledger with the id of every operation, for a client starting up"""
+        operations = {
+            year: {month: {day: [{**op, "id": self.ids[id(op)]} for op in ops] for day, ops in days.items()}
+                   for month, days in months.items()}
+            for year, months in self.data["Operations"].items()
+        }
+        return {"version": self.version, "instance": self.instance,
+                "data": {"Operations": operations, "Categories": list(self.data["Categories"]),
+                         "balance": self.data["balance"]}}
+
+    def changes_since(self, version, instance):
+        """The changes after version, or reload when they are not remembered or come from another load"""
+        if isinstance(version, bool) or not isinstance(version, int):
+            raise LedgerServiceError(f"Version must be an integer: {version!r}")
+        first = self.changes[0]["version"] if self.changes else self.version + 1
+        if instance != self.instance or version > self.version or version < first - 1:
+            return {"version": self.version, "instance": self.instance, "reload": True}
+        return {"version": self.version, "instance": self.instance, "balance": self.data["balance"],
+                "changes": list(itertools.islice(self.changes, version - first + 1, None))}
+
+    def query(self, year=None, month=None, day=None):
+        return [self.describe(self.ids[id(operation)]) for _, operation in self.iter_operations(year, month, day)]
+
+    def aggregate(self, year=None, month=None, day=None):
+        if year is None and month is None and day is None:
+            return {"balance": self.data["balance"], "categories": dict(self.category_totals)}
+        spending, earning, categories = 0, 0, {}
+        for _, operation in self.iter_operations(year, month, day):
+            value = operation["value"]
+            if value < 0:
+                spending += -value
+            else:
+                earning += value
+            categories[operation["category"]] = categories.get(operation["category"], 0) + value
+        return {"spending": spending, "earning": earning, "categories": categories}
+
+
+###########################################################
+# asyncio server
+###########################################################
+class LedgerServer:
+    """Serves one Ledger to many clients, one JSON request per line.
+
+    The file is written by a single task that waits save_delay after a change
+    and writes in an executor, so clients are never blocked by the disk.
+    """
+    MUTATIONS = {"add", "edit", "delete", "add_category"}
+
+    def __init__(self, ledger, save_delay=SAVE_DELAY):
+        self.ledger = ledger
+        self.save_delay = save_delay
+        self.dirty = False
+        self.save_task = None
+        self.actions = {
+            "load": self.ledger.load_all,
+            "changes": self.ledger.changes_since,
+            "add": self.ledger.add,
+            "edit": self.ledger.edit,
+            "delete": self.ledger.delete,
+            "add_category": self.ledger.add_category,
+            "query": self.ledger.query,
+            "aggregate": self.ledger.aggregate,
+        }
+
+    def handle_request(self, request):
+        if not isinstance(request, dict):
+            raise LedgerServiceError("Request must be a JSON object")
+        params = dict(request)
+        action = params.pop("action", None)
+        if action not in self.actions:
+            raise LedgerServiceError(f"Unknown action: {action}")
+        result = self.actions[action](**params)
+        if action in self.MUTATIONS:
+            self.dirty = True
+        return result
+
+    def schedule_save(self):
+        if self.dirty and (self.save_task is None or self.save_task.done()):
+            self.save_task = asyncio.get_running_loop().create_task(self.save_later())
+
+    async def save_later(self):
+        # changes made while writing set dirty again and are written by the next round
+        while self.dirty:
+            await asyncio.sleep(self.save_delay)
+            self.dirty = False
+            text = self.ledger.dumps()
+            await asyncio.get_running_loop().run_in_executor(None, self.ledger.write, text)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = {"ok": True, "result": self.handle_request(json.loads(line))}
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                self.schedule_save()
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        if path is not None:
+            if socket_in_use(path):
+                raise LedgerServiceError(f"A ledger service is already running on {path}")
+            # left behind by a service that did not stop cleanly
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.handle_client, path=path)
+            os.chmod(path, 0o600)
+        else:
+            server = await asyncio.start_server(self.handle_client, host=host, port=port)
+        print(f"Ledger service listening on {path or f'{host}:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # the save task may be writing in the executor, the last save waits for it
+            if self.save_task is not None:
+                try:
+                    await self.save_task
+                except Exception as e:
+                    print(f"Saving the ledger failed: {e}")
+            if self.dirty:
+                self.ledger.save()
+
+
+def socket_in_use(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+###########################################################
+# Thin client with a pool of connections
+###########################################################
+class LedgerClient:
+    """Sends requests to a LedgerServer over a pool of connections.
+
+    The app still loads the whole ledger once and then only asks for changes;
+    query and aggregate are there for clients that need less.
+    """
+    def __init__(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=CLIENT_TIMEOUT):
+        if path is None and host == DEFAULT_HOST and port == DEFAULT_PORT and hasattr(socket, "AF_UNIX"):
+            path = DEFAULT_SOCKET_PATH
+        self.path = path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        if self.path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        return sock, sock.makefile('rb')
+
+    @staticmethod
+    def _exchange(connection, message):
+        sock, reader = connection
+        try:
+            sock.sendall(message)
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("Ledger service closed the connection")
+        except OSError:
+            reader.close()
+            sock.close()
+            raise
+        return line
+
+    def request(self, action, **params):
+        message = json.dumps({"action": action, **params}).encode() + b"\n"
+        try:
+            connection = self.pool.get_nowait()
+            pooled = True
+        except queue.Empty:
+            connection = self._connect()
+            pooled = False
+        try:
+            line = self._exchange(connection, message)
+        except ConnectionError:
+            # a pooled connection may have been closed by a restart of the service, a new one is tried once;
+            # timeouts are not retried, the service may have handled the request
+            if not pooled:
+                raise
+            connection = self._connect()
+            line = self._exchange(connection, message)
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection[1].close()
+            connection[0].close()
+
+        response = json.loads(line)
+        if not response["ok"]:
+            raise LedgerServiceError(response["error"])
+        return response["result"]
+
+    def close(self):
+        while not self.pool.empty():
+            sock, reader = self.pool.get_nowait()
+            reader.close()
+            sock.close()
+
+
+if __name__ == "__main__":
+    # python ledger_service.py            -> unix socket (or localhost on windows)
+    # python ledger_service.py 8765       -> localhost tcp port
+    server = LedgerServer(Ledger())
+    if len(sys.argv) > 1:
+        asyncio.run(server.serve(port=int(sys.argv[1])))
+    elif hasattr(socket, "AF_UNIX"):
+        asyncio.run(server.serve(path=DEFAULT_SOCKET_PATH))
+    else:
+        asyncio.run(server.serve())
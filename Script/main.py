@@ -1,29 +1,46 @@
 import customtkinter as ctk
+import heapq
 import json
+import sys
 from datetime import datetime
 from tkcalendar import DateEntry
 
+from category_registry import CategoryRegistry
+from ledger_service import FILE_NAME, LedgerClient, LedgerServiceError, restore_data
+from search_index import OperationSearchIndex
+from spending_statistics import (category_month_spending_grid, operations_arrays, top_spending_categories,
+                                 weekday_spending_grid)
+
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
+import numpy as np
 
 # Constants
 MONTHS = ["January", "February", "March", "April", "May", "June",
           "July", "August", "September", "October", "November", "December"]
 
-FILE_NAME = 'database.json'
 DEFAULT_CATEGORY = "shopping"
 DEFAULT_OPERATION_TYPE = "spending"
 
 DEFAULT_GEOMETRY = "800x800"
-DEFAULT_CATEGORIES = ["shopping", "taxes", "groceries"]
-DEFAULT_FILE_PARTS = ["Operations", "Categories", "balance"]
+# how often a client checks the ledger service for changes made by other clients
+SERVICE_POLL_MS = 2000
+# the search runs once typing pauses for this long, and shows at most MAX_SEARCH_RESULTS rows
+SEARCH_DELAY_MS = 250
+MAX_SEARCH_RESULTS = 200
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+STATISTICS_VIEWS = ["Daily balance", "Weekday heatmap", "Category heatmap", "Top categories"]
+DEFAULT_TOP_CATEGORIES = 10
 
 
 class App(ctk.CTk):
-    def __init__(self):
+    def __init__(self, client=None):
         super().__init__()
         self.title("Expense Tracker")
         self.data = {}
+        # with a client the ledger is owned by ledger_service.py and the file is never written here
+        self.client = client
         self._initialize_app()
 
 ###########################################################
@@ -37,11 +54,15 @@ class App(ctk.CTk):
 
     def _initialize_app(self):
         self.load_data()
+        self.category_registry = CategoryRegistry(self.data["Categories"])
         self.sort_file()
+        self.init_search_index()
         self.set_default_values()
         self.configure_window()
         self.initialize_tabs()
         self.initialize_tabs_frames()
+        if self.client is not None:
+            self.after(SERVICE_POLL_MS, self.poll_service)
 
     def configure_window(self):
         self.geometry(DEFAULT_GEOMETRY)
@@ -58,8 +79,18 @@ class App(ctk.CTk):
         self.category = DEFAULT_CATEGORY
         self.operation_type = DEFAULT_OPERATION_TYPE
         self.balance = self.data['balance']
+        self.operations_arrays = None
 
     def load_data(self):
+        if self.client is not None:
+            loaded = self.client.request("load")
+            self.data = loaded["data"]
+            self.service_version = loaded["version"]
+            self.service_instance = loaded["instance"]
+            # operations sent by the service carry their id, edits and deletes are sent by id
+            self.service_operations = {operation["id"]: operation for months in self.data["Operations"].values()
+                                       for days in months.values() for ops in days.values() for operation in ops}
+            return
         try:
             with open(FILE_NAME, 'r') as f:
                 self.data = json.load(f)
@@ -78,19 +109,103 @@ class App(ctk.CTk):
         self.data["Operations"] = sorted_data
         self.save_to_file()
 
+    def init_search_index(self):
+        self.search_index = OperationSearchIndex()
+        for year, months in self.data["Operations"].items():
+            for month, days in months.items():
+                for day, ops in days.items():
+                    for operation in ops:
+                        self.search_index.add(f"{year}{month}{day}", operation)
+
     def restore_file(self):
-        for key in DEFAULT_FILE_PARTS:
-            if not key in self.data.keys():
-                self.data[key] = {}
-                if key == "Categories":
-                    self.data[key] = DEFAULT_CATEGORIES
-                if key == "balance":
-                    self.data[key] = 0
+        restore_data(self.data)
 
     def save_to_file(self):
+        if self.client is not None:
+            return
         with open(FILE_NAME, 'w') as f:
             json.dump(self.data, f, indent=4)
 
+    def insert_operation(self, date, operation):
+        self.data["Operations"].setdefault(date[0:4], {}).setdefault(date[4:6], {}).setdefault(
+            date[6:8], []).append(operation)
+        self.search_index.add(date, operation)
+        self.invalidate_statistics()
+
+    def update_operation(self, operation, value, category):
+        operation["value"] = value
+        operation["category"] = category
+        self.search_index.update(operation)
+        self.invalidate_statistics()
+
+    def remove_operation(self, date, operation):
+        year, month, day = date[0:4], date[4:6], date[6:8]
+        ops = self.data["Operations"][year][month][day]
+        ops.pop(next(index for index, op in enumerate(ops) if op is operation))
+        if not ops:
+            del self.data["Operations"][year][month][day]
+            if not self.data["Operations"][year][month]:
+                del self.data["Operations"][year][month]
+                if not self.data["Operations"][year]:
+                    del self.data["Operations"][year]
+        self.search_index.remove(operation)
+        self.invalidate_statistics()
+
+########################################################
+# Ledger service (python main.py --service)
+########################################################
+    def sync_with_service(self):
+        """Applies the changes made on the service since the last sync, by this client or any other"""
+        result = self.client.request("changes", version=self.service_version, instance=self.service_instance)
+        if result.get("reload"):
+            self.reload_from_service()
+            return
+        for change in result["changes"]:
+            if change["kind"] == "category":
+                self.category_registry.add(change["name"])
+                continue
+            received = change["operation"]
+            if change["kind"] == "add":
+                operation = {key: value for key, value in received.items() if key != "date"}
+                self.service_operations[operation["id"]] = operation
+                self.insert_operation(received["date"], operation)
+            elif change["kind"] == "edit":
+                operation = self.service_operations[received["id"]]
+                self.update_operation(operation, received["value"], received["category"])
+            elif change["kind"] == "delete":
+                operation = self.service_operations.pop(received["id"])
+                self.remove_operation(received["date"], operation)
+        self.service_version = result["version"]
+        self.balance = result["balance"]
+        self.change_balance()
+        if result["changes"]:
+            self.sort_file()
+            self.fill_operation_info_frame()
+            self.update_option_menus()
+
+    def reload_from_service(self):
+        self.load_data()
+        for name in self.data["Categories"]:
+            self.category_registry.add(name)
+        self.data["Categories"] = self.category_registry.names
+        self.init_search_index()
+        self.invalidate_statistics()
+        self.balance = self.data["balance"]
+        self.change_balance()
+        self.fill_operation_info_frame()
+        self.update_option_menus()
+
+    def poll_service(self):
+        try:
+            try:
+                self.sync_with_service()
+            except LedgerServiceError as e:
+                print(f"Ledger service refused the sync, reloading: {e}")
+                self.reload_from_service()
+        except OSError as e:
+            print(f"Ledger service is not reachable: {e}")
+        self.after(SERVICE_POLL_MS, self.poll_service)
+
 ########################################################
 # Layout initialising (tabs)
 ########################################################
@@ -216,10 +331,16 @@ class App(ctk.CTk):
         self.label_categories = ctk.CTkLabel(self.actions_frame, text="Categories")
         self.label_categories.grid(row=0, column=2, columnspan=2, sticky="s")
 
+        self.note_label = ctk.CTkLabel(self.actions_frame, text="Note (optional):", font=("Arial", 20))
+        self.note_label.grid(row=0, column=0, sticky="e")
+        self.note_entry = ctk.CTkEntry(self.actions_frame, font=('Arial', 16))
+        self.note_entry.grid(row=0, column=1, padx=10, sticky="ew")
+
         self._create_calendar_entry()
 
         self.category_option_menu = ctk.CTkOptionMenu(self.actions_frame, values=self.get_categories(),
                                                       command=self.set_category)
+        self.category_registry.subscribe(lambda values: self.category_option_menu.configure(values=list(values)))
         self.category_option_menu.grid(row=1, column=2, columnspan=2, padx=10, sticky="ew")
         self.category_option_menu.set(DEFAULT_CATEGORY)
 
@@ -332,10 +453,111 @@ class App(ctk.CTk):
         self.operations_info_frame.columnconfigure([0, 1, 2, 3, 4, 5], weight=1)
         self.operations_info_frame.rowconfigure([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10], weight=1)
 
+        # rows show their category as a label, the menus created by "Edit" are updated by one shared subscriber
+        self.history_category_menus = []
+        self.category_registry.subscribe(self.update_history_category_menus)
+
         self.init_option_menus()
         self.init_switches()
+        self.init_search()
         self.fill_operation_info_frame()
 
+####### Search ######
+    def init_search(self):
+        self.search_label = ctk.CTkLabel(self.history_frame, text="Search (category or note)")
+        self.search_label.grid(row=3, column=0, columnspan=2, sticky="ew")
+        self.search_entry = ctk.CTkEntry(self.history_frame)
+        self.search_entry.grid(row=4, column=0, columnspan=2, padx=5, sticky="ew")
+
+        self.min_value_label = ctk.CTkLabel(self.history_frame, text="Min value")
+        self.min_value_label.grid(row=3, column=2, columnspan=2, sticky="ew")
+        self.min_value_entry = ctk.CTkEntry(self.history_frame)
+        self.min_value_entry.grid(row=4, column=2, columnspan=2, padx=5, sticky="ew")
+
+        self.max_value_label = ctk.CTkLabel(self.history_frame, text="Max value")
+        self.max_value_label.grid(row=3, column=4, columnspan=2, sticky="ew")
+        self.max_value_entry = ctk.CTkEntry(self.history_frame)
+        self.max_value_entry.grid(row=4, column=4, columnspan=2, padx=5, sticky="ew")
+
+        # results follow the typing
+        self.search_job = None
+        self.last_search = self.get_search_fields()
+        for entry in [self.search_entry, self.min_value_entry, self.max_value_entry]:
+            entry.bind("<KeyRelease>", self.schedule_search)
+
+    def get_search_fields(self):
+        return self.search_entry.get(), self.min_value_entry.get(), self.max_value_entry.get()
+
+    def schedule_search(self, event=None):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        # keys like arrows or shift do not change the fields
+        if self.get_search_fields() == self.last_search:
+            return
+        self.fill_operation_info_frame()
+
+    def get_search_range(self):
+        """Returns the first and last timestamps allowed by the year, month and day filters.
+
+        The range narrows from the year down, so a month without a year or a day
+        without a month does not narrow it; date_matches_filters checks those.
+        """
+        day, month, year = self.filters
+        if year is None:
+            return None, None
+        if month is None:
+            return f"{year}0101", f"{year}1231"
+        month = str(month).zfill(2)
+        if day is None:
+            return f"{year}{month}01", f"{year}{month}31"
+        day = str(day).zfill(2)
+        return f"{year}{month}{day}", f"{year}{month}{day}"
+
+    def date_matches_filters(self, date):
+        day, month, year = self.filters
+        return ((year is None or date[0:4] == str(year)) and (month is None or date[4:6] == str(month).zfill(2))
+                and (day is None or date[6:8] == str(day).zfill(2)))
+
+    def get_search_matches(self):
+        """Returns the keys of the operations matching the search fields and the filters.
+
+        Returns None when the search fields are empty.
+        """
+        self.last_search = self.get_search_fields()
+        start, end = self.get_search_range()
+        values = []
+        for entry in [self.min_value_entry, self.max_value_entry]:
+            try:
+                values.append(float(entry.get()))
+            except ValueError:
+                values.append(None)
+        text = self.search_entry.get()
+        if text.strip() == "":
+            if values == [None, None]:
+                return None
+            # no words: every operation is a candidate for the value bounds
+            keys = {key for key, (date, operation) in self.search_index.operations.items()
+                    if (start is None or start <= date <= end)
+                    and (values[0] is None or operation["value"] >= values[0])
+                    and (values[1] is None or operation["value"] <= values[1])}
+        else:
+            keys = self.search_index.search(text, start=start, end=end, min_value=values[0], max_value=values[1])
+        return {key for key in keys if self.date_matches_filters(self.search_index.operations[key][0])}
+
+    def get_search_rows(self, keys):
+        """Returns the first MAX_SEARCH_RESULTS matches by date as history rows"""
+        rows = []
+        for key in heapq.nsmallest(MAX_SEARCH_RESULTS, keys, key=lambda key: self.search_index.operations[key][0]):
+            date, operation = self.search_index.operations[key]
+            ops = self.data["Operations"][date[0:4]][date[4:6]][date[6:8]]
+            index = next(index for index, op in enumerate(ops) if op is operation)
+            rows.append(([date[0:4], date[4:6], date[6:8]], index, operation))
+        return rows
+
 ####### CheckBoxes ######
     def init_switches(self):
         switch = ["disabled", "normal"]
@@ -379,12 +601,12 @@ class App(ctk.CTk):
                                                  command=self.set_filter_day)
         self.day_option_menu.grid(row=2, column=0, columnspan=1, sticky="ew")
         self.day_option_menu.set(str(now.day))
-        self.filtered_day = (str(now.day))
+        self.filtered_day = str(now.day).zfill(2)
 
         self.month_option_menu = ctk.CTkOptionMenu(self.history_frame, values=MONTHS, command=self.set_filter_month)
         self.month_option_menu.grid(row=2, column=2, columnspan=1, sticky="ew")
         self.month_option_menu.set(str(MONTHS[now.month - 1]))
-        self.filtered_month = (str(MONTHS[now.month - 1]))
+        self.filtered_month = str(now.month).zfill(2)
 
         self.year_option_menu = ctk.CTkOptionMenu(self.history_frame, values=self.get_years(),
                                                   command=self.set_filter_year)
@@ -398,60 +620,75 @@ class App(ctk.CTk):
 
     def fill_operation_info_frame(self):
         self.clear_frame(self.operations_info_frame)
+        self.history_category_menus = []
         self.filter_information()
+        search_matches = self.get_search_matches()
+        text = (f"Year: {(self.filters[2] if self.filters[2] is not None else 'All')}    "
+                f"Month: {(self.filters[1] if self.filters[1] is not None else 'All')}    "
+                f"Day: {(self.filters[0] if self.filters[0] is not None else 'All')}")
+
+        if search_matches is None:
+            self.needed_data = [[[year, month, day], ops] for year, months in self.filtered_data.items()
+                                for month, days in months.items() for day, ops in days.items()]
+            rows = [(date_operation[0], index, operation) for date_operation in self.needed_data
+                    for index, operation in enumerate(date_operation[1])]
+        else:
+            rows = self.get_search_rows(search_matches)
+            text = f"Search results: {len(rows)} of {len(search_matches)}    {text}"
 
-        self.data_label = ctk.CTkLabel(self.operations_info_frame,
-                                       text=f"Year: {(self.filters[2] if self.filters[2] is not None else 'All')}    "
-                                            f"Month: {(self.filters[1] if self.filters[1] is not None else 'All')}    "
-                                            f"Day: {(self.filters[0] if self.filters[0] is not None else 'All')}")
+        self.data_label = ctk.CTkLabel(self.operations_info_frame, text=text)
         self.data_label.grid(row=0, column=0, columnspan=6, sticky="ew")
 
-        self.needed_data = [[[year, month, day], ops] for year, months in self.filtered_data.items() for month, days in
-                            months.items() for day, ops in days.items()]
+        for row, (date_parts, index, operation) in enumerate(rows):
+            self.add_history_row(row + 1, date_parts, index, operation)
+
+    def add_history_row(self, row, date_parts, index, operation):
+        timeline = '/'.join(date_parts)
+        if operation.get('note'):
+            timeline += f"\n{operation['note']}"
+        label = ctk.CTkLabel(self.operations_info_frame, text=f"{timeline}")
+        label.grid(row=row, column=0, sticky="ew")
 
-        row = 0
-        for date_operation in self.needed_data:
-            for index, operation in enumerate(date_operation[1]):
-                timeline = '/'.join(date_operation[0])
-                label = ctk.CTkLabel(self.operations_info_frame, text=f"{timeline}")
-                label.grid(row=row + 1, column=0, sticky="ew")
+        spent_label = ctk.CTkLabel(self.operations_info_frame, text=f"Transaction:")
+        spent_label.grid(row=row, column=1, sticky="ew", padx=10)
 
-                spent_label = ctk.CTkLabel(self.operations_info_frame, text=f"Transaction:")
-                spent_label.grid(row=row + 1, column=1, sticky="ew", padx=10)
+        spent = ctk.CTkEntry(self.operations_info_frame,
+                             font=('Arial', 24), insertwidth=2, justify='center')
+        spent.insert(0, str(operation['value']))
+        spent.configure(state="disabled")
+        spent.grid(row=row, column=2, pady=10, sticky="ew")
 
-                spent = ctk.CTkEntry(self.operations_info_frame,
-                                     font=('Arial', 24), insertwidth=2, justify='center')
-                spent.insert(0, str(operation['value']))
-                spent.configure(state="disabled")
-                spent.grid(row=row + 1, column=2, pady=10, sticky="ew")
+        category_label = ctk.CTkLabel(self.operations_info_frame, text=f"Category:")
+        category_label.grid(row=row, column=3, sticky="ew", padx=10)
 
-                category_label = ctk.CTkLabel(self.operations_info_frame, text=f"Category:")
-                category_label.grid(row=row + 1, column=3, sticky="ew", padx=10)
+        category = ctk.CTkLabel(self.operations_info_frame, text=operation['category'])
+        category.grid(row=row, column=4, columnspan=1, padx=10, sticky="ew")
 
-                category = ctk.CTkOptionMenu(self.operations_info_frame, values=self.get_categories(), state="disabled")
-                category.grid(row=row + 1, column=4, columnspan=1, padx=10, sticky="ew")
-                category.set(operation['category'])
-                category.configure(state="disabled")
+        # the category menu only exists while "Edit" is checked, see edit_operation
+        edit_row = {"row": row, "category": category, "text": operation['category']}
 
-                save_button = ctk.CTkButton(self.operations_info_frame, text="Save",
-                                            command=lambda t=date_operation[0], i=index,
-                                                           s=spent, c=category: self.save_edit(t, i, s, c), width=50,
-                                            state="disabled")
+        save_button = ctk.CTkButton(self.operations_info_frame, text="Save",
+                                    command=lambda t=date_parts, i=index,
+                                                   s=spent, e=edit_row: self.save_edit(t, i, s, e["category"]),
+                                    width=50, state="disabled")
 
-                button = ctk.CTkButton(self.operations_info_frame, text="Delete",
-                                       command=lambda t=date_operation[0], i=index: self.delete_operation(t, i),
-                                       width=60, state="disabled")
+        button = ctk.CTkButton(self.operations_info_frame, text="Delete",
+                               command=lambda t=date_parts, i=index: self.delete_operation(t, i),
+                               width=60, state="disabled")
 
-                save_button.grid(row=row + 1, column=5, pady=10, sticky="ew", padx=5)
-                button.grid(row=row + 1, column=6, pady=10, sticky="ew", padx=5)
+        save_button.grid(row=row, column=5, pady=10, sticky="ew", padx=5)
+        button.grid(row=row, column=6, pady=10, sticky="ew", padx=5)
 
-                edit_var = ctk.StringVar(value="disabled")
-                edit = ctk.CTkCheckBox(self.operations_info_frame, text="Edit", command=lambda
-                    edit_array=[edit_var, spent, category, save_button, button]: self.edit_operation(edit_array),
-                                       variable=edit_var, onvalue="normal", offvalue="disabled", width=50)
-                edit.grid(row=row + 1, column=7, pady=10, sticky="ew", padx=5)
+        edit_var = ctk.StringVar(value="disabled")
+        edit_row["widgets"] = [spent, save_button, button]
+        edit = ctk.CTkCheckBox(self.operations_info_frame, text="Edit", command=lambda
+            v=edit_var, e=edit_row: self.edit_operation(v, e),
+                               variable=edit_var, onvalue="normal", offvalue="disabled", width=50)
+        edit.grid(row=row, column=7, pady=10, sticky="ew", padx=5)
 
-                row += 1
+    def update_history_category_menus(self, values):
+        for menu in self.history_category_menus:
+            menu.configure(values=list(values))
 
     def save_edit(self, time, index, spent_entry, category_menu):
         try:
@@ -461,11 +698,20 @@ class App(ctk.CTk):
 
             operation = self.data["Operations"][year][month][day][index]
 
+            if self.client is not None:
+                try:
+                    self.client.request("edit", operation_id=operation["id"], value=new_value, category=new_category,
+                                        instance=self.service_instance)
+                    print("Changes saved successfully")
+                except LedgerServiceError as e:
+                    # the operation may be gone or the service restarted, the sync shows the current ledger
+                    print(f"Failed to save changes: {e}")
+                self.sync_with_service()
+                return
+
             self.balance -= operation["value"]
             self.balance += new_value
-
-            operation["value"] = new_value
-            operation["category"] = new_category
+            self.update_operation(operation, new_value, new_category)
 
             self.change_balance()
             self.save_to_file()
@@ -508,14 +754,17 @@ class App(ctk.CTk):
 
             operation = self.data["Operations"][year][month][day][index]
 
-            self.balance -= operation["value"]
-
-            self.data["Operations"][year][month][day].pop(index)
+            if self.client is not None:
+                try:
+                    self.client.request("delete", operation_id=operation["id"], instance=self.service_instance)
+                    print("successful delete")
+                except LedgerServiceError as e:
+                    print(f"Deletion faced an error: {e}")
+                self.sync_with_service()
+                return
 
-            if not self.data["Operations"][year][month][day]:
-                del self.data["Operations"][year][month][day]
-                if not self.data["Operations"][year][month]:
-                    del self.data["Operations"][year]
+            self.balance -= operation["value"]
+            self.remove_operation(f"{year}{month}{day}", operation)
 
             self.change_balance()
             self.save_to_file()
@@ -525,13 +774,21 @@ class App(ctk.CTk):
         except Exception as e:
             print(f"Deletion faced an error: {e}")
 
-    def edit_operation(self, edit_array):
-        if edit_array[0].get()=="disabled":
-            for button in edit_array[1:]:
+    def edit_operation(self, edit_var, edit_row):
+        edit_row["category"].destroy()
+        if edit_var.get()=="disabled":
+            self.history_category_menus.remove(edit_row["category"])
+            category = ctk.CTkLabel(self.operations_info_frame, text=edit_row["text"])
+            for button in edit_row["widgets"]:
                 button.configure(state="disabled")
         else:
-            for button in edit_array[1:]:
+            category = ctk.CTkOptionMenu(self.operations_info_frame, values=self.get_categories())
+            category.set(edit_row["text"])
+            self.history_category_menus.append(category)
+            for button in edit_row["widgets"]:
                 button.configure(state="normal")
+        category.grid(row=edit_row["row"], column=4, columnspan=1, padx=10, sticky="ew")
+        edit_row["category"] = category
 
 
 
@@ -585,21 +842,101 @@ class App(ctk.CTk):
         year_options = self.get_years()
         month_options = [MONTHS[i] for i in range(12)]
 
-        self.year_combobox = ctk.CTkComboBox(self.statistics_frame, values=year_options)
-        self.year_combobox.grid(row=0, column=0, padx=10, pady=10)
-        self.year_combobox.set(str(datetime.now().year))
+        self.statistics_year_option_menu = ctk.CTkOptionMenu(self.statistics_frame, values=year_options)
+        self.statistics_year_option_menu.grid(row=0, column=0, padx=10, pady=10)
+        self.statistics_year_option_menu.set(str(datetime.now().year))
 
-        self.month_combobox = ctk.CTkComboBox(self.statistics_frame, values=month_options)
-        self.month_combobox.grid(row=0, column=1, padx=10, pady=10)
-        self.month_combobox.set(MONTHS[datetime.now().month - 1])
+        self.statistics_month_option_menu = ctk.CTkOptionMenu(self.statistics_frame, values=month_options)
+        self.statistics_month_option_menu.grid(row=0, column=1, padx=10, pady=10)
+        self.statistics_month_option_menu.set(MONTHS[datetime.now().month - 1])
 
         self.generate_graph_button = ctk.CTkButton(self.statistics_frame, text="Generate Graph",
                                                    command=self.generate_statistics_graph)
         self.generate_graph_button.grid(row=0, column=2, padx=10, pady=10)
 
+        # second row: the end of the range and the kind of graph (daily balance only uses the first row)
+        self.statistics_to_year_option_menu = ctk.CTkOptionMenu(self.statistics_frame, values=year_options)
+        self.statistics_to_year_option_menu.grid(row=1, column=0, padx=10, pady=10)
+        self.statistics_to_year_option_menu.set(str(datetime.now().year))
+
+        self.statistics_to_month_option_menu = ctk.CTkOptionMenu(self.statistics_frame, values=month_options)
+        self.statistics_to_month_option_menu.grid(row=1, column=1, padx=10, pady=10)
+        self.statistics_to_month_option_menu.set(MONTHS[datetime.now().month - 1])
+
+        self.statistics_view_menu = ctk.CTkOptionMenu(self.statistics_frame, values=STATISTICS_VIEWS)
+        self.statistics_view_menu.grid(row=1, column=2, padx=10, pady=10)
+        self.statistics_view_menu.set(STATISTICS_VIEWS[0])
+
     def generate_statistics_graph(self):
-        selected_year = self.year_combobox.get()
-        selected_month = str(MONTHS.index(self.month_combobox.get()) + 1).zfill(2)
+        view = self.statistics_view_menu.get()
+        if view == STATISTICS_VIEWS[0]:
+            self.generate_daily_balance_graph()
+            return
+
+        start, end = self.get_statistics_range()
+        plt.style.use('dark_background')
+        fig, ax = plt.subplots(figsize=(5, 4))
+        if view == STATISTICS_VIEWS[1]:
+            self.draw_weekday_heatmap(ax, start, end)
+        elif view == STATISTICS_VIEWS[2]:
+            self.draw_category_heatmap(ax, start, end)
+        else:
+            self.draw_top_categories(ax, start, end)
+        fig.tight_layout()
+        self.show_statistics_figure(fig)
+
+    def show_statistics_figure(self, fig):
+        if getattr(self, "statistics_canvas", None) is not None:
+            self.statistics_canvas.get_tk_widget().destroy()
+        self.statistics_canvas = FigureCanvasTkAgg(fig, master=self.statistics_frame)
+        self.statistics_canvas.get_tk_widget().grid(row=2, column=0, columnspan=3, sticky="nsew")
+        plt.close(fig)
+        self.statistics_canvas.draw()
+
+    def get_statistics_range(self):
+        """Returns the first day of the start month and the last day of the end month as datetime64"""
+        start_month = str(MONTHS.index(self.statistics_month_option_menu.get()) + 1).zfill(2)
+        end_month = str(MONTHS.index(self.statistics_to_month_option_menu.get()) + 1).zfill(2)
+        start = np.datetime64(f"{self.statistics_year_option_menu.get()}-{start_month}")
+        end = np.datetime64(f"{self.statistics_to_year_option_menu.get()}-{end_month}")
+        if end < start:
+            start, end = end, start
+        return start.astype('datetime64[D]'), (end + 1).astype('datetime64[D]') - 1
+
+    def draw_weekday_heatmap(self, ax, start, end):
+        grid, first_monday = weekday_spending_grid(self.get_operations_arrays(), start, end)
+        image = ax.imshow(grid, aspect='auto', cmap='magma', interpolation='nearest')
+        ax.figure.colorbar(image, ax=ax)
+        ax.set_yticks(range(7), WEEKDAYS)
+        weeks = grid.shape[1]
+        ticks = np.linspace(0, weeks - 1, min(weeks, 8)).astype(int)
+        ax.set_xticks(ticks, [str(first_monday + 7 * int(week)) for week in ticks], rotation=45, ha='right')
+        ax.set_title(f"Spending by weekday {start} - {end}", color='white')
+
+    def draw_category_heatmap(self, ax, start, end):
+        grid, names, first_month = category_month_spending_grid(self.get_operations_arrays(), start, end,
+                                                                DEFAULT_TOP_CATEGORIES)
+        if not names:
+            ax.text(0.5, 0.5, 'No spending in this range', fontsize=12, va='center', ha='center',
+                    transform=ax.transAxes, color='white')
+            return
+        image = ax.imshow(grid, aspect='auto', cmap='magma', interpolation='nearest')
+        ax.figure.colorbar(image, ax=ax)
+        ax.set_yticks(range(len(names)), names)
+        months = grid.shape[1]
+        ticks = np.linspace(0, months - 1, min(months, 12)).astype(int)
+        ax.set_xticks(ticks, [str(first_month + int(month)) for month in ticks], rotation=45, ha='right')
+        ax.set_title(f"Spending by category {start} - {end}", color='white')
+
+    def draw_top_categories(self, ax, start, end):
+        names, totals = top_spending_categories(self.get_operations_arrays(), start, end, DEFAULT_TOP_CATEGORIES)
+        ax.barh(names[::-1], totals[::-1], color='#FF6F61')
+        ax.set_xlabel("Spent", color='white')
+        ax.set_title(f"Top {DEFAULT_TOP_CATEGORIES} categories {start} - {end}", color='white')
+
+    def generate_daily_balance_graph(self):
+        selected_year = self.statistics_year_option_menu.get()
+        selected_month = str(MONTHS.index(self.statistics_month_option_menu.get()) + 1).zfill(2)
 
         monthly_operations = self.data["Operations"].get(selected_year, {}).get(selected_month, {})
         expenses_per_day = {day: sum(op["value"] for op in ops) for day, ops in monthly_operations.items()}
@@ -611,27 +948,29 @@ class App(ctk.CTk):
 
         fig, ax = plt.subplots(figsize=(5, 4))
         ax.plot(days, expenses, marker='o', color='cyan')
-        ax.set_title(f"Balance in {self.month_combobox.get()} {selected_year}", color='white')
+        ax.set_title(f"Balance in {self.statistics_month_option_menu.get()} {selected_year}", color='white')
         ax.set_xlabel("Day", color='white')
         ax.set_ylabel("Balance", color='white')
 
         ax.tick_params(axis='x', colors='white')
         ax.tick_params(axis='y', colors='white')
 
-        canvas = FigureCanvasTkAgg(fig, master=self.statistics_frame)
-        canvas_widget = canvas.get_tk_widget()
+        self.show_statistics_figure(fig)
 
-        canvas_widget.grid(row=2, column=0, columnspan=3, sticky="nsew")
-
-        plt.close(fig)
-
-        self.statistics_frame.grid_rowconfigure(2, weight=6)
-        self.statistics_frame.grid_columnconfigure(0, weight=1)
+###########################################################
+# Statistics computations (vectorized over all operations)
+###########################################################
+    def get_operations_arrays(self):
+        """The operations as numpy arrays (see spending_statistics.operations_arrays).
 
-        self.statistics_frame.grid_rowconfigure(0, weight=1)
-        self.statistics_frame.grid_rowconfigure(1, weight=0)
+        The arrays are cached and rebuilt only after the operations change.
+        """
+        if self.operations_arrays is None:
+            self.operations_arrays = operations_arrays(self.data["Operations"], self.category_registry)
+        return self.operations_arrays
 
-        canvas.draw()
+    def invalidate_statistics(self):
+        self.operations_arrays = None
 
 
 ###########################################################
@@ -662,10 +1001,9 @@ class App(ctk.CTk):
             return [str(datetime.now().year)]
 
     def get_categories(self):
-        try:
-            return sorted(self.data["Categories"])
-        except AttributeError:
+        if len(self.category_registry) == 0:
             return [DEFAULT_CATEGORY]
+        return list(self.category_registry.sorted())
 
     def submit_calendar(self):
         date = self.date_entry.get_date()
@@ -689,17 +1027,20 @@ class App(ctk.CTk):
         self.timestamp = self.get_timestamp()
         try:
             value = int(self.value_entry.get())
+            note = self.note_entry.get().strip()
+            if self.client is not None:
+                self.client.request("add", date=self.timestamp, value=value, category=self.category, note=note)
+                self.sync_with_service()
+                self.error_label.configure(text="Added", text_color="green")
+                return
             self.balance += value
             operation = {
                 "value": value,
                 "category": self.category
             }
-            try:
-                self.data.setdefault("Operations", {}).setdefault(self.timestamp[0:4], {}).setdefault(
-                    self.timestamp[4:6], {}).setdefault(self.timestamp[6:8], []).append(operation)
-            except KeyError:
-                self.data["Operations"] = {
-                    self.timestamp[0:4]: {self.timestamp[4:6]: {self.timestamp[6:8]: [operation]}}}
+            if note:
+                operation["note"] = note
+            self.insert_operation(self.timestamp, operation)
 
             self.change_balance()
             self.sort_file()
@@ -713,26 +1054,34 @@ class App(ctk.CTk):
                 self.error_label.configure(text="No input", text_color="red")
             else:
                 self.error_label.configure(text="Your input is not numeric", text_color="red")
+        except (OSError, LedgerServiceError) as e:
+            self.error_label.configure(text=f"Ledger service error: {e}", text_color="red")
 
     def add_category(self):
         category = self.category_entry.get()
-        if category in self.data["Categories"]:
+        if category in self.category_registry:
             print("Category already exist")
         elif category != "":
-            try:
-                self.data["Categories"].append(category)
-                self.category_option_menu.configure(values=self.get_categories())
-
-            except:
-                self.data["Categories"] = [category]
+            if self.client is not None:
+                try:
+                    self.client.request("add_category", name=category)
+                    self.sync_with_service()
+                except (OSError, LedgerServiceError) as e:
+                    self.error_label.configure(text=f"Ledger service error: {e}", text_color="red")
+                return
+            self.category_registry.add(category)
             self.save_to_file()
         else:
             print("Your input is invalid")
 
     def update_option_menus(self):
-        self.year_option_menu.configure(values=self.get_years())
+        years = self.get_years()
+        self.year_option_menu.configure(values=years)
+        self.statistics_year_option_menu.configure(values=years)
+        self.statistics_to_year_option_menu.configure(values=years)
 
 
 if __name__ == "__main__":
-    app = App()
+    # python main.py --service connects to a running ledger_service.py instead of opening the file
+    app = App(client=LedgerClient() if "--service" in sys.argv else None)
     app.mainloop()
@@ -0,0 +1,83 @@
+import re
+
+
+class OperationSearchIndex:
+    """Inverted index over the category and note of every operation.
+
+    Words are stored in a trie whose nodes keep the keys of all the
+    operations having a word with that prefix, so a prefix lookup only
+    walks the letters of the prefix. Operations are keyed by id() of their
+    dict, which is kept alive in self.operations.
+    """
+    def __init__(self):
+        self.root = {}
+        self.operations = {}
+        self.words = {}
+
+    @staticmethod
+    def tokenize(text):
+        return set(re.findall(r"\w+", text.lower()))
+
+    def operation_words(self, operation):
+        return self.tokenize(f"{operation['category']} {operation.get('note', '')}")
+
+    def add(self, date, operation):
+        key = id(operation)
+        self.operations[key] = (date, operation)
+        self.words[key] = self.operation_words(operation)
+        for word in self.words[key]:
+            node = self.root
+            for letter in word:
+                node = node.setdefault(letter, {"": set()})
+                node[""].add(key)
+
+    def remove(self, operation):
+        key = id(operation)
+        for word in self.words.pop(key, ()):
+            node = self.root
+            for letter in word:
+                # words sharing a prefix may already have emptied and dropped this path
+                child = node.get(letter)
+                if child is None:
+                    break
+                child[""].discard(key)
+                if not child[""]:
+                    del node[letter]
+                    break
+                node = child
+        self.operations.pop(key, None)
+
+    def update(self, operation):
+        date, _ = self.operations[id(operation)]
+        self.remove(operation)
+        self.add(date, operation)
+
+    def prefix_keys(self, prefix):
+        node = self.root
+        for letter in prefix:
+            node = node.get(letter)
+            if node is None:
+                return set()
+        return node[""]
+
+    def search(self, text, start=None, end=None, min_value=None, max_value=None):
+        """Returns the keys of the operations matching every word of text as a prefix.
+
+        start and end are "YYYYMMDD" timestamps, min_value and max_value bound the value.
+        """
+        words = sorted(self.tokenize(text), key=len, reverse=True)
+        if not words:
+            return set()
+        keys = set(self.prefix_keys(words[0]))
+        for word in words[1:]:
+            keys &= self.prefix_keys(word)
+        if start is None and end is None and min_value is None and max_value is None:
+            return keys
+        matches = set()
+        for key in keys:
+            date, operation = self.operations[key]
+            if ((start is None or date >= start) and (end is None or date <= end)
+                    and (min_value is None or operation["value"] >= min_value)
+                    and (max_value is None or operation["value"] <= max_value)):
+                matches.add(key)
+        return matches
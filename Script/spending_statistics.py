@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def operations_arrays(operations, category_registry):
+    """Flattens the operations tree of the file into numpy arrays.
+
+    Returns the dates, values and category ids of every operation and the
+    category name of every id. Ids are the ones of the registry; categories
+    missing from it get the next ids here only, the registry is not changed.
+    """
+    names = list(category_registry.names)
+    extra_ids = {}
+    dates, values, category_ids = [], [], []
+    for year, months in operations.items():
+        for month, days in months.items():
+            for day, ops in days.items():
+                date = f"{year}-{month}-{day}"
+                for operation in ops:
+                    category = operation["category"]
+                    category_id = category_registry.get_id(category)
+                    if category_id is None:
+                        if category not in extra_ids:
+                            extra_ids[category] = len(names)
+                            names.append(category)
+                        category_id = extra_ids[category]
+                    dates.append(date)
+                    values.append(operation["value"])
+                    category_ids.append(category_id)
+    return (np.array(dates, dtype='datetime64[D]'), np.array(values, dtype=float),
+            np.array(category_ids, dtype=int), names)
+
+
+def spending_in_range(arrays, start, end):
+    dates, values, category_ids, _ = arrays
+    mask = (dates >= start) & (dates <= end) & (values < 0)
+    return dates[mask], -values[mask], category_ids[mask]
+
+
+def weekday_spending_grid(arrays, start, end):
+    """Returns a 7 x weeks grid of spending and the monday of the first week.
+
+    Days of the first and last week outside start and end are NaN, so they
+    are not drawn like days without spending.
+    """
+    dates, spent, _ = spending_in_range(arrays, start, end)
+    # 1970-01-01 was a thursday, so shifting by 3 makes monday 0
+    first_monday = start - (start.astype(int) + 3) % 7
+    weeks = int((end - first_monday).astype(int) // 7) + 1
+    offsets = (dates - first_monday).astype(int)
+    cells = (offsets % 7) * weeks + offsets // 7
+    # bincount of nothing gives integers, floats are needed for NaN
+    grid = np.bincount(cells, weights=spent, minlength=7 * weeks).astype(float).reshape(7, weeks)
+    cell_days = first_monday + np.arange(7)[:, None] + 7 * np.arange(weeks)[None, :]
+    grid[(cell_days < start) | (cell_days > end)] = np.nan
+    return grid, first_monday
+
+
+def top_category_ids(arrays, start, end, top_n):
+    """Returns the ids and totals of the top_n categories by spending, biggest first"""
+    _, spent, category_ids = spending_in_range(arrays, start, end)
+    totals = np.bincount(category_ids, weights=spent, minlength=len(arrays[3]))
+    order = np.argsort(totals, kind='stable')[::-1][:top_n]
+    order = order[totals[order] > 0]
+    return order, totals[order]
+
+
+def top_spending_categories(arrays, start, end, top_n):
+    """Returns the names and totals of the top_n categories by spending, biggest first"""
+    top_ids, totals = top_category_ids(arrays, start, end, top_n)
+    return [arrays[3][category_id] for category_id in top_ids], totals
+
+
+def category_month_spending_grid(arrays, start, end, top_n):
+    """Returns a categories x months grid of spending for the top_n categories of the range"""
+    dates, spent, category_ids = spending_in_range(arrays, start, end)
+    top_ids, _ = top_category_ids(arrays, start, end, top_n)
+
+    first_month = start.astype('datetime64[M]')
+    months = int((end.astype('datetime64[M]') - first_month).astype(int)) + 1
+    rows = np.full(len(arrays[3]), -1)
+    rows[top_ids] = np.arange(len(top_ids))
+    category_rows = rows[category_ids]
+    selected = category_rows >= 0
+    month_offsets = (dates[selected].astype('datetime64[M]') - first_month).astype(int)
+    cells = category_rows[selected] * months + month_offsets
+    grid = np.bincount(cells, weights=spent[selected], minlength=len(top_ids) * months).astype(float)
+    names = [arrays[3][category_id] for category_id in top_ids]
+    return grid.reshape(len(top_ids), months), names, first_month
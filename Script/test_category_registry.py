@@ -0,0 +1,48 @@
+import unittest
+
+from category_registry import CategoryRegistry
+
+
+class TestCategoryRegistry(unittest.TestCase):
+    def test_duplicates_are_removed_from_the_stored_list(self):
+        names = ["taxes", "shopping", "taxes"]
+        registry = CategoryRegistry(names)
+        self.assertEqual(names, ["taxes", "shopping"])
+        self.assertEqual(len(registry), 2)
+
+    def test_ids_stay_stable(self):
+        names = ["taxes", "shopping"]
+        registry = CategoryRegistry(names)
+        self.assertTrue(registry.add("groceries"))
+        self.assertTrue(registry.add("bills"))
+        self.assertEqual([registry.get_id(name) for name in ["taxes", "shopping", "groceries", "bills"]],
+                         [0, 1, 2, 3])
+        self.assertEqual(registry.get_name(2), "groceries")
+        self.assertIsNone(registry.get_id("clothes"))
+        self.assertEqual(names, ["taxes", "shopping", "groceries", "bills"])
+
+    def test_add_existing_category(self):
+        registry = CategoryRegistry(["taxes"])
+        self.assertFalse(registry.add("taxes"))
+        self.assertIn("taxes", registry)
+        self.assertEqual(len(registry), 1)
+
+    def test_sorted_is_cached_until_add(self):
+        registry = CategoryRegistry(["taxes", "bills"])
+        first = registry.sorted()
+        self.assertEqual(first, ("bills", "taxes"))
+        self.assertIs(registry.sorted(), first)
+        registry.add("clothes")
+        self.assertEqual(registry.sorted(), ("bills", "clothes", "taxes"))
+
+    def test_subscribers_get_the_values_on_subscribe_and_add(self):
+        registry = CategoryRegistry(["taxes"])
+        received = []
+        registry.subscribe(received.append)
+        registry.add("bills")
+        registry.add("bills")
+        self.assertEqual(received, [("taxes",), ("bills", "taxes")])
+
+
+if __name__ == "__main__":
+    unittest.main()
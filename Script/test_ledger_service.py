@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+from ledger_service import Ledger, LedgerClient, LedgerServer, LedgerServiceError, socket_in_use
+
+SAMPLE_DATA = {
+    "Operations": {
+        "2024": {
+            "11": {
+                "11": [{"value": 15000, "category": "salary"}],
+                "30": [{"value": -150.0, "category": "shopping"}]
+            },
+            "12": {
+                "02": [{"value": -400.0, "category": "taxes"}]
+            }
+        }
+    },
+    "Categories": ["shopping", "taxes", "groceries", "salary"],
+    "balance": 14450.0
+}
+
+
+class LedgerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "database.json")
+        with open(self.file_name, 'w') as f:
+            json.dump(SAMPLE_DATA, f)
+        self.ledger = Ledger(self.file_name)
+        self.server = LedgerServer(self.ledger, save_delay=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def find_id(self, category):
+        return next(op["id"] for op in self.ledger.query() if op["category"] == category)
+
+    def read_file(self):
+        with open(self.file_name) as f:
+            return json.load(f)
+
+
+class TestLedger(LedgerTestCase):
+    def test_load_gives_ids_and_totals(self):
+        operations = self.ledger.query()
+        self.assertEqual(sorted(op["id"] for op in operations), [0, 1, 2])
+        self.assertEqual(self.ledger.category_totals, {"salary": 15000, "shopping": -150.0, "taxes": -400.0})
+
+    def test_load_of_missing_file_uses_defaults(self):
+        ledger = Ledger(os.path.join(self.directory.name, "missing.json"))
+        self.assertEqual(ledger.data, {"Operations": {}, "Categories": ["shopping", "taxes", "groceries"],
+                                       "balance": 0})
+
+    def test_add(self):
+        change = self.ledger.add("20241105", -20, "groceries", note="market")
+        self.assertEqual(change["kind"], "add")
+        self.assertEqual(change["operation"], {"id": 3, "date": "20241105", "value": -20,
+                                               "category": "groceries", "note": "market"})
+        self.assertEqual(self.ledger.data["balance"], 14430.0)
+        self.assertEqual(self.ledger.category_totals["groceries"], -20)
+        self.assertEqual(list(self.ledger.data["Operations"]["2024"]["11"]), ["05", "11", "30"])
+
+    def test_edit(self):
+        operation_id = self.find_id("shopping")
+        self.ledger.edit(operation_id, -50.0, "taxes", instance=self.ledger.instance)
+        self.assertEqual(self.ledger.data["balance"], 14550.0)
+        self.assertEqual(self.ledger.category_totals["shopping"], 0)
+        self.assertEqual(self.ledger.category_totals["taxes"], -450.0)
+        self.assertEqual(self.ledger.data["Operations"]["2024"]["11"]["30"], [{"value": -50.0, "category": "taxes"}])
+
+    def test_delete_prunes_empty_month_and_year(self):
+        self.ledger.delete(self.find_id("taxes"), instance=self.ledger.instance)
+        self.assertNotIn("12", self.ledger.data["Operations"]["2024"])
+        self.assertEqual(self.ledger.data["balance"], 14850.0)
+        self.assertEqual(self.ledger.category_totals["taxes"], 0)
+
+        self.ledger.delete(self.find_id("salary"), instance=self.ledger.instance)
+        self.ledger.delete(self.find_id("shopping"), instance=self.ledger.instance)
+        self.assertEqual(self.ledger.data["Operations"], {})
+        self.assertEqual(self.ledger.data["balance"], 0)
+
+    def test_ids_stay_valid_after_delete(self):
+        shopping_id = self.find_id("shopping")
+        self.ledger.delete(self.find_id("salary"), instance=self.ledger.instance)
+        self.ledger.edit(shopping_id, -10, "shopping", instance=self.ledger.instance)
+        self.assertEqual(self.ledger.data["Operations"]["2024"]["11"]["30"][0]["value"], -10)
+        with self.assertRaises(LedgerServiceError):
+            self.ledger.edit(0, 1, "salary", instance=self.ledger.instance)
+
+    def test_add_category(self):
+        self.assertEqual(self.ledger.add_category("clothes")["name"], "clothes")
+        self.assertIsNone(self.ledger.add_category("clothes"))
+        self.assertEqual(self.ledger.data["Categories"].count("clothes"), 1)
+
+    def test_aggregate(self):
+        self.assertEqual(self.ledger.aggregate(year="2024", month="11"),
+                         {"spending": 150.0, "earning": 15000, "categories": {"salary": 15000, "shopping": -150.0}})
+        self.assertEqual(self.ledger.aggregate()["balance"], 14450.0)
+
+    def test_changes_since(self):
+        version = self.ledger.version
+        self.ledger.add("20241201", -1, "taxes")
+        self.ledger.delete(self.find_id("salary"), instance=self.ledger.instance)
+        result = self.ledger.changes_since(version, self.ledger.instance)
+        self.assertEqual([change["kind"] for change in result["changes"]], ["add", "delete"])
+        self.assertEqual(result["balance"], self.ledger.data["balance"])
+        self.assertEqual(self.ledger.changes_since(result["version"], self.ledger.instance)["changes"], [])
+
+    def test_changes_since_forgotten_version_asks_for_reload(self):
+        ledger = Ledger(self.file_name, max_changes=2)
+        for day in ["01", "02", "03"]:
+            ledger.add(f"202412{day}", -1, "taxes")
+        self.assertTrue(ledger.changes_since(0, ledger.instance)["reload"])
+        self.assertEqual(len(ledger.changes_since(1, ledger.instance)["changes"]), 2)
+
+    def test_restart_asks_for_reload_and_rejects_stale_edits(self):
+        self.ledger.add("20241201", -1, "taxes")
+        self.ledger.save()
+        old_instance, old_version = self.ledger.instance, self.ledger.version
+        shopping_id = self.find_id("shopping")
+
+        restarted = Ledger(self.file_name)
+        self.assertNotEqual(restarted.instance, old_instance)
+        # the old version is newer than anything the restarted ledger has seen
+        self.assertTrue(restarted.changes_since(old_version, old_instance)["reload"])
+        self.assertTrue(restarted.changes_since(0, old_instance)["reload"])
+        self.assertTrue(restarted.changes_since(restarted.version + 1, restarted.instance)["reload"])
+        for stale in [lambda: restarted.edit(shopping_id, -1, "shopping", instance=old_instance),
+                      lambda: restarted.delete(shopping_id, instance=old_instance),
+                      lambda: restarted.delete(shopping_id, instance=None)]:
+            with self.assertRaises(LedgerServiceError):
+                stale()
+        self.assertEqual(restarted.data["balance"], 14449.0)
+        self.assertEqual(restarted.version, 0)
+
+
+class TestMalformedRequests(LedgerTestCase):
+    def assert_unchanged(self, request):
+        before = (json.dumps(self.ledger.data, sort_keys=True), dict(self.ledger.category_totals),
+                  self.ledger.version)
+        with self.assertRaises((LedgerServiceError, TypeError)):
+            self.server.handle_request(request)
+        after = (json.dumps(self.ledger.data, sort_keys=True), dict(self.ledger.category_totals),
+                 self.ledger.version)
+        self.assertEqual(before, after)
+        self.assertFalse(self.server.dirty)
+
+    def test_edit_with_string_value(self):
+        self.assert_unchanged({"action": "edit", "operation_id": self.find_id("shopping"), "value": "7",
+                               "category": "shopping", "instance": self.ledger.instance})
+
+    def test_add_with_string_value(self):
+        self.assert_unchanged({"action": "add", "date": "20241201", "value": "7", "category": "taxes"})
+
+    def test_add_with_bad_dates(self):
+        for date in ["2024121", "20241301", "20240230", "2024-12-01", 20241201]:
+            self.assert_unchanged({"action": "add", "date": date, "value": 1, "category": "taxes"})
+
+    def test_add_with_bad_category_or_note(self):
+        self.assert_unchanged({"action": "add", "date": "20241201", "value": 1, "category": ""})
+        self.assert_unchanged({"action": "add", "date": "20241201", "value": 1, "category": 3})
+        self.assert_unchanged({"action": "add", "date": "20241201", "value": 1, "category": "taxes", "note": 5})
+
+    def test_unknown_operation_id(self):
+        self.assert_unchanged({"action": "delete", "operation_id": 99, "instance": self.ledger.instance})
+        self.assert_unchanged({"action": "delete", "operation_id": "0", "instance": self.ledger.instance})
+
+    def test_missing_or_stale_instance(self):
+        self.assert_unchanged({"action": "delete", "operation_id": self.find_id("shopping")})
+        self.assert_unchanged({"action": "delete", "operation_id": self.find_id("shopping"), "instance": "old"})
+
+    def test_unknown_action_and_parameters(self):
+        self.assert_unchanged({"action": "drop"})
+        self.assert_unchanged({"value": 1})
+        self.assert_unchanged({"action": "delete", "operation_id": 0, "instance": self.ledger.instance, "index": 0})
+        self.assert_unchanged(["add"])
+
+
+class TestServer(LedgerTestCase):
+    def test_mutations_are_saved_by_the_save_task(self):
+        async def run():
+            self.server.handle_request({"action": "add", "date": "20241201", "value": -5, "category": "taxes"})
+            self.server.schedule_save()
+            await self.server.save_task
+
+        asyncio.run(run())
+        self.assertFalse(self.server.dirty)
+        self.assertEqual(self.read_file()["balance"], 14445.0)
+        self.assertEqual(self.read_file()["Operations"]["2024"]["12"]["01"], [{"value": -5, "category": "taxes"}])
+
+    def test_queries_do_not_save(self):
+        self.server.handle_request({"action": "query", "year": "2024"})
+        self.assertFalse(self.server.dirty)
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs unix sockets")
+class TestService(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.directory.name, "ledger.sock")
+
+    def start_service(self):
+        """Runs the server in a thread until the returned function is called"""
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(self.server.serve(path=self.path))
+
+        def run_service():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=run_service, daemon=True)
+        thread.start()
+        for _ in range(100):
+            if socket_in_use(self.path):
+                break
+            threading.Event().wait(0.01)
+
+        def stop():
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join(timeout=5)
+            loop.close()
+        return stop
+
+    def test_client_round_trip(self):
+        stop = self.start_service()
+        try:
+            client = LedgerClient(path=self.path)
+            loaded = client.request("load")
+            change = client.request("add", date="20241201", value=-5, category="taxes")
+            self.assertEqual(client.request("changes", version=loaded["version"],
+                                            instance=loaded["instance"])["changes"], [change])
+            with self.assertRaises(LedgerServiceError):
+                client.request("edit", operation_id=change["operation"]["id"], value="7", category="taxes",
+                               instance=loaded["instance"])
+            self.assertEqual(client.request("aggregate")["categories"]["taxes"], -405.0)
+            client.close()
+        finally:
+            stop()
+        # the pending change is written when the service stops
+        self.assertEqual(self.read_file()["balance"], 14445.0)
+
+    def test_socket_is_private_and_not_taken_over(self):
+        stop = self.start_service()
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+            second = LedgerServer(Ledger(self.file_name), save_delay=0)
+            with self.assertRaises(LedgerServiceError):
+                asyncio.run(second.serve(path=self.path))
+            self.assertEqual(LedgerClient(path=self.path).request("load")["instance"], self.ledger.instance)
+        finally:
+            stop()
+
+    def test_stale_socket_file_is_replaced(self):
+        left_over = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        left_over.bind(self.path)
+        left_over.close()
+        stop = self.start_service()
+        try:
+            self.assertEqual(LedgerClient(path=self.path).request("aggregate")["balance"], 14450.0)
+        finally:
+            stop()
+
+    def test_dead_pooled_connection_is_replaced(self):
+        stop = self.start_service()
+        try:
+            client = LedgerClient(path=self.path)
+            dead, peer = socket.socketpair()
+            peer.close()
+            client.pool.put_nowait((dead, dead.makefile('rb')))
+            self.assertEqual(client.request("aggregate")["balance"], 14450.0)
+            client.close()
+        finally:
+            stop()
+
+    def test_silent_service_times_out(self):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen()
+        try:
+            with self.assertRaises(TimeoutError):
+                LedgerClient(path=self.path, timeout=0.1).request("load")
+        finally:
+            listener.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from search_index import OperationSearchIndex
+
+
+class TestOperationSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = OperationSearchIndex()
+        self.shop = {"value": -10, "category": "shop", "note": "corner store"}
+        self.shopping = {"value": -40, "category": "shopping", "note": "winter coat"}
+        self.salary = {"value": 500, "category": "salary"}
+        self.index.add("20241106", self.shop)
+        self.index.add("20241202", self.shopping)
+        self.index.add("20241130", self.salary)
+
+    def keys(self, *operations):
+        return {id(operation) for operation in operations}
+
+    def test_add_matches_prefixes_of_category_and_note(self):
+        self.assertEqual(self.index.search("sho"), self.keys(self.shop, self.shopping))
+        self.assertEqual(self.index.search("Shopping"), self.keys(self.shopping))
+        self.assertEqual(self.index.search("coat"), self.keys(self.shopping))
+        self.assertEqual(self.index.search("taxes"), set())
+        self.assertEqual(self.index.search("  "), set())
+
+    def test_remove_words_sharing_a_prefix(self):
+        self.index.remove(self.shopping)
+        self.assertEqual(self.index.search("shop"), self.keys(self.shop))
+        self.assertEqual(self.index.search("shopp"), set())
+        self.index.remove(self.shop)
+        self.assertEqual(self.index.search("s"), self.keys(self.salary))
+        self.assertNotIn("h", self.index.root["s"])
+        self.assertNotIn(id(self.shop), self.index.operations)
+
+    def test_update_reindexes_the_edited_operation(self):
+        self.shop["category"] = "groceries"
+        self.index.update(self.shop)
+        self.assertEqual(self.index.search("shop"), self.keys(self.shopping))
+        self.assertEqual(self.index.search("groc"), self.keys(self.shop))
+        self.assertEqual(self.index.operations[id(self.shop)][0], "20241106")
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.index.search("shop store"), self.keys(self.shop))
+        self.assertEqual(self.index.search("store shop"), self.keys(self.shop))
+        self.assertEqual(self.index.search("shopping store"), set())
+
+    def test_date_and_value_bounds(self):
+        self.assertEqual(self.index.search("s", start="20241130"), self.keys(self.shopping, self.salary))
+        self.assertEqual(self.index.search("s", end="20241130"), self.keys(self.shop, self.salary))
+        self.assertEqual(self.index.search("s", start="20241201", end="20241231"), self.keys(self.shopping))
+        self.assertEqual(self.index.search("s", min_value=-10), self.keys(self.shop, self.salary))
+        self.assertEqual(self.index.search("s", max_value=-10), self.keys(self.shop, self.shopping))
+        self.assertEqual(self.index.search("s", min_value=-20, max_value=0), self.keys(self.shop))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from category_registry import CategoryRegistry
+from spending_statistics import (category_month_spending_grid, operations_arrays, top_spending_categories,
+                                 weekday_spending_grid)
+
+OPERATIONS = {
+    "2024": {
+        "11": {
+            # 2024-11-06 is a wednesday
+            "06": [{"value": -10, "category": "shopping"}, {"value": 500, "category": "salary"}],
+            "10": [{"value": -20, "category": "taxes"}],
+            "30": [{"value": -5, "category": "pets"}]
+        },
+        "12": {
+            "02": [{"value": -40, "category": "shopping"}, {"value": -1, "category": "groceries"}]
+        }
+    }
+}
+
+
+class StatisticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.categories = ["shopping", "taxes", "groceries", "salary"]
+        self.registry = CategoryRegistry(self.categories)
+        self.arrays = operations_arrays(OPERATIONS, self.registry)
+
+
+class TestOperationsArrays(StatisticsTestCase):
+    def test_unknown_categories_get_local_ids(self):
+        _, values, category_ids, names = self.arrays
+        self.assertEqual(names, ["shopping", "taxes", "groceries", "salary", "pets"])
+        self.assertEqual(category_ids.tolist(), [0, 3, 1, 4, 0, 2])
+        self.assertEqual(values.tolist(), [-10, 500, -20, -5, -40, -1])
+        # the stored category list is left alone
+        self.assertEqual(self.categories, ["shopping", "taxes", "groceries", "salary"])
+        self.assertNotIn("pets", self.registry)
+
+
+class TestWeekdaySpendingGrid(StatisticsTestCase):
+    def test_range_starting_mid_week(self):
+        start, end = np.datetime64("2024-11-06"), np.datetime64("2024-11-12")
+        grid, first_monday = weekday_spending_grid(self.arrays, start, end)
+        self.assertEqual(first_monday, np.datetime64("2024-11-04"))
+        self.assertEqual(grid.shape, (7, 2))
+        self.assertEqual(grid[2, 0], 10)      # wednesday of the first week
+        self.assertEqual(grid[6, 0], 20)      # sunday 2024-11-10
+        self.assertEqual(grid[1, 1], 0)       # tuesday 2024-11-12, in range without spending
+        # monday and tuesday before start, wednesday to sunday after end
+        self.assertTrue(np.isnan(grid[[0, 1], 0]).all())
+        self.assertTrue(np.isnan(grid[2:, 1]).all())
+        self.assertEqual(np.nansum(grid), 30)
+
+    def test_empty_ledger(self):
+        arrays = operations_arrays({}, CategoryRegistry([]))
+        grid, first_monday = weekday_spending_grid(arrays, np.datetime64("2024-11-04"), np.datetime64("2024-11-10"))
+        self.assertEqual(grid.tolist(), [[0.0]] * 7)
+        self.assertEqual(first_monday, np.datetime64("2024-11-04"))
+
+
+class TestCategories(StatisticsTestCase):
+    def test_top_categories(self):
+        names, totals = top_spending_categories(self.arrays, np.datetime64("2024-11-01"),
+                                                np.datetime64("2024-12-31"), 10)
+        self.assertEqual(names, ["shopping", "taxes", "pets", "groceries"])
+        self.assertEqual(totals.tolist(), [50, 20, 5, 1])
+
+    def test_category_outside_the_top_is_left_out(self):
+        grid, names, first_month = category_month_spending_grid(self.arrays, np.datetime64("2024-11-01"),
+                                                                np.datetime64("2024-12-31"), 2)
+        self.assertEqual(names, ["shopping", "taxes"])
+        self.assertEqual(first_month, np.datetime64("2024-11"))
+        self.assertEqual(grid.tolist(), [[10, 40], [20, 0]])
+
+    def test_category_grid_of_empty_ledger(self):
+        arrays = operations_arrays({}, CategoryRegistry([]))
+        grid, names, _ = category_month_spending_grid(arrays, np.datetime64("2024-11-01"),
+                                                      np.datetime64("2024-12-31"), 10)
+        self.assertEqual(names, [])
+        self.assertEqual(grid.shape, (0, 2))
+        self.assertEqual(top_spending_categories(arrays, np.datetime64("2024-11-01"),
+                                                 np.datetime64("2024-12-31"), 10)[0], [])
+
+
+if __name__ == "__main__":
+    unittest.main()